@@ -1,11 +1,12 @@
 import argparse
 import json
 import re
-from opensearchpy import OpenSearch, RequestsHttpConnection
-from sentence_transformers import SentenceTransformer
 import os
+import time
 import dotenv
 
+_START_TIME = time.perf_counter()  # used to report cold-start time to first result
+
 # Load environment variables from .env file
 dotenv.load_dotenv()
 # --- Configuration ---
@@ -15,103 +16,156 @@ OPENSEARCH_USER = os.getenv('OPENSEARCH_USER', 'admin')
 OPENSEARCH_PASSWORD = os.getenv('OPENSEARCH_PASSWORD', '')  # set Environment variable or set second argument as password
 INDEX_NAME = os.getenv('INDEX_NAME', 'my-email-data')  # The OpenSearch index name you created
 EMBEDDING_MODEL_NAME = os.getenv('EMBEDDING_MODEL_NAME', 'all-MiniLM-L6-v2')  # Added missing variable
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')  # 'torch', 'onnx' or 'openvino'
+EMBEDDING_MODEL_FILE = os.getenv('EMBEDDING_MODEL_FILE', '')  # e.g. 'onnx/model_qint8_avx512_vnni.onnx' for a quantized ONNX model
 EMBEDDINGS_DIMENSION = 384
 combined_output_file = "enron_emails_combined.json"
 output_folder = "json_batches"
-model = SentenceTransformer(EMBEDDING_MODEL_NAME)  # only for converting the query into a embedding
 
-# --- OpenSearch Client Setup ---
-client = OpenSearch(
-    hosts=[{'host': OPENSEARCH_HOST, 'port': OPENSEARCH_PORT}],
-    http_compress=True,
-    http_auth=(OPENSEARCH_USER, OPENSEARCH_PASSWORD),
-    use_ssl=True,
-    verify_certs=False,  # False for self-signed certificates, True for valid CA-signed certs
-    ssl_assert_hostname=False,
-    ssl_show_warn=False,
-    connection_class=RequestsHttpConnection
+# The model and client are created on first use so that --help and email-only
+# queries don't pay for importing torch or loading model weights.
+_model = None
+_client = None
+
+# --- Query Parsing Patterns ---
+# Compiled once at import; a single alternation tokenizes the query in one pass.
+EMAIL_PATTERN = r'[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}'
+QUERY_TOKEN_RE = re.compile(
+    rf'(?P<keyword>from|sender|to|recipient)[:\s]+(?P<keyword_email>{EMAIL_PATTERN})'
+    rf'|\b(?P<email>{EMAIL_PATTERN})\b',
+    re.IGNORECASE
 )
+FROM_KEYWORDS = ('from', 'sender')
+# A keyword left directly in front of a consumed match, e.g. "to" in "to from a@b.com"
+DANGLING_KEYWORD_RE = re.compile(r'\b(?:from|sender|to|recipient)[:\s]*$', re.IGNORECASE)
+
+
+def get_model():
+    """Returns the embedding model, loading it on first call."""
+    global _model
+    if _model is None:
+        from sentence_transformers import SentenceTransformer  # imports torch, so only done when needed
+        print(f"Loading embedding model: {EMBEDDING_MODEL_NAME} (backend: {EMBEDDING_BACKEND})...")
+        kwargs = {}
+        if EMBEDDING_BACKEND != 'torch':
+            kwargs['backend'] = EMBEDDING_BACKEND  # requires sentence-transformers>=3.2 and optimum
+            if EMBEDDING_MODEL_FILE:
+                kwargs['model_kwargs'] = {'file_name': EMBEDDING_MODEL_FILE}
+        elif EMBEDDING_MODEL_FILE:
+            print(f"Warning: EMBEDDING_MODEL_FILE='{EMBEDDING_MODEL_FILE}' is ignored with the 'torch' backend. "
+                  "Set EMBEDDING_BACKEND to 'onnx' or 'openvino' to use it.")
+        try:
+            _model = SentenceTransformer(EMBEDDING_MODEL_NAME, **kwargs)  # only for converting the query into a embedding
+        except TypeError as e:
+            if 'backend' not in kwargs:
+                raise
+            raise RuntimeError(
+                f"EMBEDDING_BACKEND='{EMBEDDING_BACKEND}' requires sentence-transformers>=3.2 "
+                "(pip install -U 'sentence-transformers>=3.2' 'optimum[onnxruntime]')."
+            ) from e
+    return _model
+
+
+def get_client():
+    """Returns the OpenSearch client, creating it on first call."""
+    global _client
+    if _client is None:
+        from opensearchpy import OpenSearch, RequestsHttpConnection
+        _client = OpenSearch(
+            hosts=[{'host': OPENSEARCH_HOST, 'port': OPENSEARCH_PORT}],
+            http_compress=True,
+            http_auth=(OPENSEARCH_USER, OPENSEARCH_PASSWORD),
+            use_ssl=True,
+            verify_certs=False,  # False for self-signed certificates, True for valid CA-signed certs
+            ssl_assert_hostname=False,
+            ssl_show_warn=False,
+            connection_class=RequestsHttpConnection
+        )
+    return _client
 
 # --- Functions ---
-def load_json_data(file_path):
-    """returns a dictionary with uid as key"""
+def load_json_data(file_path, uids=None):
+    """
+    returns a dictionary with uid as key, optionally restricted to the given uids.
+    When uids is given, lines not containing one of them are skipped without parsing
+    and reading stops as soon as all of them have been found.
+    """
     data = {}
+    remaining = set(uids) if uids is not None else None
     with open(file_path, 'r', encoding='utf-8') as f:
         for line in f:
+            if remaining is not None:
+                if not remaining:
+                    break
+                if not any(uid in line for uid in remaining):
+                    continue
             try:
                 record = json.loads(line)
                 uid = record.get("uid")
-                if uid:
+                if uid and (remaining is None or uid in remaining):
                     data[uid] = record
+                    if remaining is not None:
+                        remaining.discard(uid)
             except json.JSONDecodeError as e:
                 print(f"Error decoding JSON: {e}")
     return data
 
-def extract_email_addresses(query_text):
-    """Extract email addresses from query text and determine if they are from/to filters."""
-    # Email regex pattern
-    email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    emails = re.findall(email_pattern, query_text, re.IGNORECASE)
-    
-    # Check for from/to keywords
+def parse_query(query_text):
+    """
+    Splits the query into email filters and the remaining text for semantic search.
+
+    Returns a tuple (email_info, cleaned_text) where email_info has the same shape
+    as extract_email_addresses(). A bare from/to/sender/recipient keyword directly
+    in front of a consumed match is dropped too, so "to from a@b.com" cleans to ''.
+    """
     from_emails = []
     to_emails = []
-    
-    # Look for patterns like "from:email" or "from email"
-    from_patterns = [
-        r'from[:\s]+([A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,})',
-        r'sender[:\s]+([A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,})'
-    ]
-    
-    # Look for patterns like "to:email" or "to email"
-    to_patterns = [
-        r'to[:\s]+([A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,})',
-        r'recipient[:\s]+([A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,})'
-    ]
-    
-    for pattern in from_patterns:
-        matches = re.findall(pattern, query_text, re.IGNORECASE)
-        from_emails.extend(matches)
-    
-    for pattern in to_patterns:
-        matches = re.findall(pattern, query_text, re.IGNORECASE)
-        to_emails.extend(matches)
-    
+    emails = []
+    kept_parts = []
+    last_end = 0
+
+    for match in QUERY_TOKEN_RE.finditer(query_text):
+        kept_parts.append(DANGLING_KEYWORD_RE.sub('', query_text[last_end:match.start()]))
+        last_end = match.end()
+        keyword = match.group('keyword')
+        if keyword:
+            email = match.group('keyword_email')
+            if keyword.lower() in FROM_KEYWORDS:
+                from_emails.append(email)
+            else:
+                to_emails.append(email)
+        else:
+            email = match.group('email')
+        emails.append(email)
+    kept_parts.append(query_text[last_end:])
+
     # If no explicit from/to patterns found, treat all emails as general filters
     general_emails = []
     if not from_emails and not to_emails and emails:
         general_emails = emails
-    
-    return {
+
+    email_info = {
         'from_emails': list(set(from_emails)),
         'to_emails': list(set(to_emails)),
         'general_emails': list(set(general_emails))
     }
+    # Clean up extra whitespace
+    cleaned_text = ' '.join(''.join(kept_parts).split())
+    return email_info, cleaned_text
+
+def extract_email_addresses(query_text):
+    """Extract email addresses from query text and determine if they are from/to filters."""
+    return parse_query(query_text)[0]
 
 def clean_query_text(query_text):
     """Remove email addresses and from/to keywords from query text for semantic search."""
-    # Remove email patterns with from/to keywords
-    patterns_to_remove = [
-        r'from[:\s]+[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}',
-        r'to[:\s]+[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}',
-        r'sender[:\s]+[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}',
-        r'recipient[:\s]+[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}',
-        r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'  # standalone emails
-    ]
-    
-    cleaned_text = query_text
-    for pattern in patterns_to_remove:
-        cleaned_text = re.sub(pattern, '', cleaned_text, flags=re.IGNORECASE)
-    
-    # Clean up extra whitespace
-    cleaned_text = ' '.join(cleaned_text.split())
-    return cleaned_text.strip()
+    return parse_query(query_text)[1]
 
 def generate_query_embedding(query_text):
     """Generates an embedding for the search query using the local model."""
     if not query_text:
         return None
-    embeddings = model.encode([query_text])
+    embeddings = get_model().encode([query_text])
     return embeddings[0].tolist()
 
 def build_email_filters(email_info):
@@ -227,7 +281,7 @@ def perform_knn_search(query_embedding, target_field=None, k=5, email_filters=No
         }
     
     try:
-        response = client.search(
+        response = get_client().search(
             index=INDEX_NAME,
             body=search_body
         )
@@ -238,11 +292,13 @@ def perform_knn_search(query_embedding, target_field=None, k=5, email_filters=No
 
 def print_search_results(response):
     """Prints the search results in a readable format."""
-    if(not os.path.exists(combined_output_file)):
-    	os.system(f"cat {output_folder}/*.json > {combined_output_file}")
-    data_json = load_json_data(combined_output_file)
-
     if response and response['hits']['hits']:
+        if(not os.path.exists(combined_output_file)):
+            os.system(f"cat {output_folder}/*.json > {combined_output_file}")
+        # Only keep the records for the returned hits instead of the whole dataset
+        hit_uids = {hit['_source'].get('uid') for hit in response['hits']['hits']} - {None}
+        data_json = load_json_data(combined_output_file, uids=hit_uids)
+        print(f"Time to first result: {time.perf_counter() - _START_TIME:.2f}s")
         print(f"Found {response['hits']['total']['value']} hits:\n")
         for i, hit in enumerate(response['hits']['hits']):
             uid = hit['_source'].get('uid')
@@ -277,17 +333,13 @@ if __name__ == "__main__":
 
     print(f"Original query: {query_text}")
     
-    # Extract email information from query
-    email_info = extract_email_addresses(query_text)
+    # Extract email information and clean query text for semantic search in one pass
+    email_info, cleaned_query = parse_query(query_text)
     print(f"Extracted email info: {email_info}")
-    
-    # Clean query text for semantic search
-    cleaned_query = clean_query_text(query_text)
     print(f"Cleaned query for semantic search: '{cleaned_query}'")
     
     # Generate embedding for cleaned query
     if cleaned_query:
-        print(f"Loading embedding model: {EMBEDDING_MODEL_NAME}...")
         query_embedding = generate_query_embedding(cleaned_query)
         if query_embedding is None:
             print("Could not generate embedding for query. Exiting.")
@@ -315,7 +367,7 @@ if __name__ == "__main__":
             }
         }
         try:
-            response = client.search(index=INDEX_NAME, body=search_body)
+            response = get_client().search(index=INDEX_NAME, body=search_body)
             print_search_results(response)
         except Exception as e:
             print(f"Error during email-filtered search: {e}")